@@ -4,15 +4,17 @@ MQTT Subscriber Service for IoT Waste Platform
 Subscribes to sensor data from MQTT broker and stores in PostgreSQL
 """
 
-import json
 import logging
 import os
+import queue
+import threading
 from datetime import datetime
 from typing import Dict, Any
 from pathlib import Path
+import orjson
 import paho.mqtt.client as mqtt
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import time
 from dotenv import load_dotenv
 
@@ -32,6 +34,27 @@ logger = logging.getLogger(__name__)
 class DatabaseManager:
     """Handles PostgreSQL database operations"""
 
+    # Buffered readings are flushed once either threshold is reached
+    FLUSH_MAX_ROWS = 200
+    FLUSH_MAX_AGE_S = 1.0
+
+    # Sensor lookup cache is reloaded after this many seconds
+    SENSOR_CACHE_TTL_S = 60.0
+
+    # Readings kept buffered while the DB is unreachable; beyond this the
+    # oldest are dropped so a long outage cannot exhaust memory
+    BUFFER_MAX_ROWS = 5000
+
+    # Single statement text for all flushes, so Postgres sees a stable
+    # query shape and the string is not rebuilt per flush
+    INSERT_READINGS_SQL = """
+        INSERT INTO sensor_readings (
+            sensor_id, bin_id, fill_level, distance_cm, weight_kg,
+            temperature_c, humidity, gas_level, battery_level,
+            signal_strength, timestamp
+        ) VALUES %s
+    """
+
     def __init__(self, host: str = None, port: int = None,
                  database: str = None, user: str = None,
                  password: str = None):
@@ -45,174 +68,255 @@ class DatabaseManager:
         }
         self.conn = None
         self.cursor = None
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        # {mac_address: (sensor_id, bin_id, weight_offset)} / {sensor_code: ...}
+        self._sensor_by_mac = {}
+        self._sensor_by_code = {}
+        self._sensor_cache_loaded = 0.0
+        # Cached fallback timestamp for payloads without one
+        self._cached_ts = None
+        self._cached_ts_at = 0.0
 
     def connect(self):
         """Connect to PostgreSQL database"""
         try:
             self.conn = psycopg2.connect(**self.connection_params)
             self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+            # Telemetry inserts don't need to wait for the WAL fsync;
+            # worst case on a crash is losing the last fraction of a
+            # second of readings (session-scoped, dashboards unaffected)
+            self.cursor.execute("SET synchronous_commit TO OFF")
             logger.info(f"✅ Connected to database at {self.connection_params['host']}")
+            self._load_sensor_cache()
             return True
         except Exception as e:
             logger.error(f"❌ Database connection error: {e}")
             return False
 
+    def reconnect(self) -> bool:
+        """Re-establish a lost database connection (e.g. after a Postgres
+        restart). connect() re-applies the session settings and reloads
+        the sensor cache, so a successful reconnect restores the exact
+        working state."""
+        try:
+            if self.conn is not None:
+                self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+        self.cursor = None
+        return self.connect()
+
     def disconnect(self):
         """Disconnect from database"""
+        self.flush()
         if self.cursor:
             self.cursor.close()
         if self.conn:
             self.conn.close()
         logger.info("🔌 Disconnected from database")
 
-    def insert_sensor_reading(self, data: Dict[str, Any]) -> bool:
-        """Insert sensor reading into database"""
+    def _load_sensor_cache(self):
+        """Load the sensors table into in-memory lookup dicts"""
         try:
-            sensor_result = None
-            weight_offset = 0.0
-
-            # 1. Try MAC address lookup first (registered device)
-            mac = data.get('mac_address', '').strip().upper()
+            self.cursor.execute(
+                "SELECT sensor_id, bin_id, mac_address, sensor_code, weight_offset FROM sensors"
+            )
+            by_mac = {}
+            by_code = {}
+            for row in self.cursor.fetchall():
+                entry = (row['sensor_id'], row['bin_id'],
+                         float(row.get('weight_offset') or 0.0))
+                if row.get('mac_address'):
+                    by_mac[row['mac_address'].strip().upper()] = entry
+                if row.get('sensor_code'):
+                    by_code[row['sensor_code']] = entry
+            self._sensor_by_mac = by_mac
+            self._sensor_by_code = by_code
+            self._sensor_cache_loaded = time.monotonic()
+            logger.debug(f"🔄 Sensor cache loaded ({len(by_code)} sensors)")
+        except Exception as e:
+            # Keep the previous cache on failure; rollback is guarded
+            # because on a lost connection it raises too
+            logger.error(f"❌ Error loading sensor cache: {e}")
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+
+    def _resolve_sensor(self, mac: str, sensor_code: str):
+        """Resolve (sensor_id, bin_id, weight_offset) from the in-memory cache.
+
+        MAC address wins over sensor_code (registered devices). On a cache
+        miss the sensors table is reloaded once and the lookup retried, so
+        newly registered devices are picked up without restarting.
+        """
+        if time.monotonic() - self._sensor_cache_loaded >= self.SENSOR_CACHE_TTL_S:
+            self._load_sensor_cache()
+
+        result = None
+        if mac:
+            result = self._sensor_by_mac.get(mac)
+        if result is None and sensor_code:
+            result = self._sensor_by_code.get(sensor_code)
+
+        if result is None and (mac or sensor_code):
+            # Unknown device — maybe registered since the last reload
+            self._load_sensor_cache()
             if mac:
-                self.cursor.execute(
-                    "SELECT sensor_id, bin_id, weight_offset FROM sensors WHERE mac_address = %s",
-                    (mac,)
-                )
-                sensor_result = self.cursor.fetchone()
-                if sensor_result:
-                    weight_offset = float(sensor_result.get('weight_offset') or 0.0)
-                    # Override bin_id from registration (ignore payload's bin_id)
-                    data = dict(data)
-                    data['bin_id'] = str(sensor_result['bin_id'])
-                    logger.debug(f"🔍 MAC match: {mac} → sensor_id={sensor_result['sensor_id']}")
-
-            # 2. Fall back to sensor_code lookup
-            if not sensor_result:
-                self.cursor.execute(
-                    "SELECT sensor_id, weight_offset FROM sensors WHERE sensor_code = %s",
-                    (data.get('sensor_code'),)
-                )
-                sensor_result = self.cursor.fetchone()
-                if sensor_result:
-                    weight_offset = float(sensor_result.get('weight_offset') or 0.0)
+                result = self._sensor_by_mac.get(mac)
+            if result is None and sensor_code:
+                result = self._sensor_by_code.get(sensor_code)
+
+        return result
+
+    def _fallback_timestamp(self) -> str:
+        """ISO timestamp for payloads that carry none.
+
+        Messages arriving within the same 100 ms share one formatted
+        value instead of paying the tz lookup + isoformat() per row.
+        """
+        now = time.monotonic()
+        if self._cached_ts is None or now - self._cached_ts_at >= 0.1:
+            self._cached_ts = datetime.now().astimezone().isoformat()
+            self._cached_ts_at = now
+        return self._cached_ts
+
+    def insert_sensor_reading(self, data: Dict[str, Any]) -> bool:
+        """Buffer a sensor reading for batched insertion.
+
+        Readings are not written immediately — they are appended to an
+        in-memory buffer and flushed as a single multi-row INSERT (see
+        flush()), so each MQTT message no longer pays a full round-trip
+        plus commit fsync.
+        """
+        try:
+            # Read every field exactly once into locals — no dict copies,
+            # no repeated .get() churn on the hot path
+            mac = (data.get('mac_address') or '').strip().upper()
+            sensor_code = data.get('sensor_code')
+            sensor_result = self._resolve_sensor(mac, sensor_code)
 
             if not sensor_result:
-                logger.warning(f"⚠️  Unknown device — MAC={mac or 'N/A'}, sensor_code={data.get('sensor_code', 'N/A')}")
+                logger.warning(f"⚠️  Unknown device — MAC={mac or 'N/A'}, sensor_code={sensor_code or 'N/A'}")
                 return False
 
-            sensor_id = sensor_result['sensor_id']
+            sensor_id, cached_bin_id, weight_offset = sensor_result
+
+            if mac and mac in self._sensor_by_mac:
+                # Registered device: bin_id comes from the registration,
+                # the payload's bin_id is ignored
+                bin_id = cached_bin_id
+                logger.debug("🔍 MAC match: %s → sensor_id=%s", mac, sensor_id)
+            else:
+                bin_id = int(data.get('bin_id'))
 
             # Apply weight offset calibration
-            raw_weight = data.get('weight_kg')
-            if raw_weight is not None and weight_offset != 0.0:
-                data = dict(data)
-                data['weight_kg'] = float(raw_weight) + weight_offset
-
-            # Insert reading
-            insert_query = """
-                INSERT INTO sensor_readings (
-                    sensor_id, bin_id, fill_level, distance_cm, weight_kg,
-                    temperature_c, humidity, gas_level, battery_level,
-                    signal_strength, timestamp
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-            """
-
-            values = (
+            weight_kg = data.get('weight_kg')
+            if weight_kg is not None and weight_offset != 0.0:
+                weight_kg = float(weight_kg) + weight_offset
+
+            self._buffer.append((
                 sensor_id,
-                int(data.get('bin_id')),
+                bin_id,
                 data.get('fill_level'),
                 data.get('distance_cm'),
-                data.get('weight_kg'),
+                weight_kg,
                 data.get('temperature_c'),
                 data.get('humidity'),
                 data.get('gas_level'),
                 data.get('battery_level'),
                 data.get('signal_strength'),
-                data.get('timestamp') or datetime.now().astimezone().isoformat()
-            )
+                data.get('timestamp') or self._fallback_timestamp()
+            ))
 
-            self.cursor.execute(insert_query, values)
-            self.conn.commit()
-
-            logger.debug(f"💾 Saved reading for {data.get('bin_code')}")
+            logger.debug("💾 Buffered reading for %s", data.get('bin_code'))
             return True
 
         except Exception as e:
-            logger.error(f"❌ Error inserting sensor reading: {e}")
-            self.conn.rollback()
+            logger.error(f"❌ Error buffering sensor reading: {e}")
             return False
 
-    def check_and_create_alert(self, data: Dict[str, Any]):
-        """Check sensor data and create alerts if necessary"""
-        try:
-            bin_id = int(data.get('bin_id'))
-            bin_code = data.get('bin_code')
-            fill_level = data.get('fill_level', 0)
-            battery_level = data.get('battery_level', 100)
-            temperature = data.get('temperature_c', 25)
-
-            # Check for bin full alert
-            if fill_level >= 90:
-                self._create_alert(
-                    bin_id, bin_code, 'bin_full', 'critical',
-                    f'Bin {bin_code} is {fill_level:.1f}% full - requires immediate collection'
-                )
-            elif fill_level >= 75:
-                self._create_alert(
-                    bin_id, bin_code, 'bin_full', 'high',
-                    f'Bin {bin_code} is {fill_level:.1f}% full - collection needed soon'
-                )
-
-            # Check for low battery
-            if battery_level < 20:
-                self._create_alert(
-                    bin_id, bin_code, 'sensor_fault', 'medium',
-                    f'Low battery warning for {bin_code}: {battery_level:.1f}%'
-                )
-
-            # Check for unusual temperature
-            if temperature > 45:
-                self._create_alert(
-                    bin_id, bin_code, 'unusual_activity', 'high',
-                    f'High temperature detected in {bin_code}: {temperature:.1f}°C'
-                )
-
-        except Exception as e:
-            logger.error(f"❌ Error checking alerts: {e}")
+    def flush(self) -> bool:
+        """Write all buffered readings in one multi-row INSERT and commit"""
+        if not self._buffer:
+            self._last_flush = time.monotonic()
+            return True
 
-    def _create_alert(self, bin_id: int, bin_code: str, alert_type: str,
-                      severity: str, message: str):
-        """Create an alert if it doesn't already exist"""
+        batch = self._buffer
+        self._buffer = []
+        self._last_flush = time.monotonic()
         try:
-            # Check if similar alert already exists and is open
-            self.cursor.execute(
-                """
-                SELECT alert_id FROM alerts
-                WHERE bin_id = %s AND alert_type = %s AND status = 'open'
-                """,
-                (bin_id, alert_type)
-            )
-
-            if self.cursor.fetchone():
-                return  # Alert already exists
-
-            # Create new alert
-            self.cursor.execute(
-                """
-                INSERT INTO alerts (bin_id, alert_type, severity, message, status)
-                VALUES (%s, %s, %s, %s, 'open')
-                """,
-                (bin_id, alert_type, severity, message)
+            execute_values(
+                self.cursor,
+                self.INSERT_READINGS_SQL,
+                batch,
+                page_size=500
             )
             self.conn.commit()
-
-            logger.warning(f"🚨 ALERT [{severity.upper()}]: {message}")
-
+            logger.debug("💾 Flushed %d readings", len(batch))
+            return True
         except Exception as e:
-            logger.error(f"❌ Error creating alert: {e}")
+            logger.error(f"❌ Batch insert failed ({len(batch)} readings): {e}")
+            if not self._rollback_or_requeue(batch):
+                return False
+            # The transaction is clean again — the batch failed on data,
+            # not on the connection, so isolate the poison row(s) instead
+            # of discarding everyone's readings
+            return self._flush_individually(batch)
+
+    def _rollback_or_requeue(self, batch) -> bool:
+        """Roll back the failed transaction; if even that fails the
+        connection is gone, so requeue the batch for the next flush."""
+        try:
             self.conn.rollback()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Rollback failed (connection lost?): {e}")
+            self._requeue(batch)
+            # The connection is unusable — reconnect now so the requeued
+            # readings actually go out on the next flush instead of
+            # failing against the same dead socket forever
+            if self.reconnect():
+                logger.info("✅ Database reconnected — buffered readings "
+                            "will be retried on the next flush")
+            return False
+
+    def _requeue(self, batch):
+        """Put a batch back at the front of the buffer, bounded by
+        BUFFER_MAX_ROWS (oldest readings are dropped first)."""
+        self._buffer[:0] = batch
+        overflow = len(self._buffer) - self.BUFFER_MAX_ROWS
+        if overflow > 0:
+            del self._buffer[:overflow]
+            logger.error(f"❌ Buffer full — dropped {overflow} oldest readings")
+
+    def _flush_individually(self, batch) -> bool:
+        """Insert a failed batch row by row, committing each, so only the
+        rows Postgres actually rejects are lost."""
+        inserted = 0
+        for i, row in enumerate(batch):
+            try:
+                execute_values(self.cursor, self.INSERT_READINGS_SQL, (row,))
+                self.conn.commit()
+                inserted += 1
+            except Exception as e:
+                logger.error(f"❌ Dropping unpersistable reading {row!r}: {e}")
+                if not self._rollback_or_requeue(batch[i + 1:]):
+                    # Connection died mid-retry; the rest will be retried
+                    logger.warning("⚠️  %d readings flushed before connection loss",
+                                   inserted)
+                    return False
+        logger.warning("⚠️  Recovered batch: %d/%d readings flushed individually",
+                       inserted, len(batch))
+        return True
+
+    def maybe_flush(self):
+        """Flush the buffer if it is large or old enough"""
+        if (len(self._buffer) >= self.FLUSH_MAX_ROWS or
+                time.monotonic() - self._last_flush >= self.FLUSH_MAX_AGE_S):
+            self.flush()
 
 
 class MQTTSubscriber:
@@ -226,34 +330,44 @@ class MQTTSubscriber:
         self.mqtt_port = mqtt_port or int(os.getenv('MQTT_PORT', '1883'))
         self.mqtt_username = mqtt_username or os.getenv('MQTT_USERNAME')
         self.mqtt_password = mqtt_password or os.getenv('MQTT_PASSWORD')
+        # When set, workers join a shared subscription group and the
+        # broker load-balances messages across them (Mosquitto 2.x),
+        # so several subscriber processes can run in parallel
+        self.shared_group = os.getenv('MQTT_SHARED_GROUP', '')
         self.db_manager = db_manager
         self.client = None
         self.connected = False
-
-    def on_connect(self, client, userdata, flags, rc):
-        """Callback when connected to MQTT broker"""
-        if rc == 0:
+        # Parsed payloads queue between the Paho network thread and the
+        # DB worker, so a slow commit never blocks the receive loop
+        self._queue = queue.Queue(maxsize=10000)
+        self._worker = None
+
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        """Callback when connected to MQTT broker (paho v2 API)"""
+        if reason_code == 0:
             self.connected = True
             logger.info(f"✅ Connected to MQTT Broker at {self.mqtt_broker}:{self.mqtt_port}")
 
             # Subscribe to all waste bin sensor topics
             topic = "waste/bins/+/sensors"
+            if self.shared_group:
+                topic = f"$share/{self.shared_group}/{topic}"
             client.subscribe(topic)
             logger.info(f"📡 Subscribed to topic: {topic}")
         else:
-            logger.error(f"❌ Failed to connect, return code {rc}")
+            logger.error(f"❌ Failed to connect, reason code {reason_code}")
 
-    def on_disconnect(self, client, userdata, rc):
-        """Callback when disconnected from MQTT broker"""
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        """Callback when disconnected from MQTT broker (paho v2 API)"""
         self.connected = False
-        if rc != 0:
-            logger.warning(f"⚠️  Unexpected disconnection, return code {rc}")
+        if reason_code != 0:
+            logger.warning(f"⚠️  Unexpected disconnection, reason code {reason_code}")
 
     def on_message(self, client, userdata, msg):
         """Callback when message is received"""
         try:
-            # Parse JSON payload
-            data = json.loads(msg.payload.decode())
+            # Parse JSON payload (orjson parses bytes directly, no decode)
+            data = orjson.loads(msg.payload)
 
             bin_code = data.get('bin_code', 'UNKNOWN')
             fill_level = data.get('fill_level', 0)
@@ -263,28 +377,32 @@ class MQTTSubscriber:
             # Log received data
             fill_icon = "🟢" if fill_level < 50 else "🟡" if fill_level < 75 else "🔴"
             logger.info(
-                f"{fill_icon} Received from {bin_code}: "
-                f"Fill={fill_level:.1f}% | Temp={temp:.1f}°C | Battery={battery:.1f}%"
+                "%s Received from %s: Fill=%.1f%% | Temp=%.1f°C | Battery=%.1f%%",
+                fill_icon, bin_code, fill_level, temp, battery
             )
 
-            # Store in database
+            # Hand off to the DB worker thread; never block the
+            # network thread on Postgres
             if self.db_manager:
-                success = self.db_manager.insert_sensor_reading(data)
-
-                if success:
-                    # Check for alerts
-                    self.db_manager.check_and_create_alert(data)
+                try:
+                    self._queue.put_nowait(data)
+                except queue.Full:
+                    logger.warning(f"⚠️  DB queue full — dropping reading from {bin_code}")
             else:
                 logger.warning("⚠️  No database manager configured")
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"❌ JSON decode error: {e}")
         except Exception as e:
             logger.error(f"❌ Error processing message: {e}")
 
     def connect(self):
         """Connect to MQTT broker"""
-        self.client = mqtt.Client(client_id="waste_backend_subscriber")
+        # PID suffix keeps client_ids distinct when several workers run
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"waste_backend_subscriber_{os.getpid()}"
+        )
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
@@ -304,19 +422,71 @@ class MQTTSubscriber:
             logger.error(f"❌ Error connecting to MQTT: {e}")
             return False
 
+    def _db_worker(self):
+        """Drain the queue and write readings in batches.
+
+        Runs on its own thread so Postgres commit latency is decoupled
+        from broker throughput. The short get() timeout keeps the
+        age-based flush ticking when traffic is quiet.
+        """
+        try:
+            while True:
+                # Nothing in here may kill the thread: a dead worker with
+                # a live MQTT loop means every reading is silently dropped
+                # once the queue fills
+                try:
+                    try:
+                        data = self._queue.get(timeout=DatabaseManager.FLUSH_MAX_AGE_S)
+                    except queue.Empty:
+                        self.db_manager.maybe_flush()
+                        continue
+
+                    self.db_manager.insert_sensor_reading(data)
+                    # Coalesce whatever else is already waiting into this batch
+                    while len(self.db_manager._buffer) < DatabaseManager.FLUSH_MAX_ROWS:
+                        try:
+                            self.db_manager.insert_sensor_reading(self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+
+                    # Alert thresholds are evaluated by the fn_check_alerts
+                    # trigger when the batch is flushed
+                    self.db_manager.maybe_flush()
+                except Exception as e:
+                    # Transient DB trouble (e.g. Postgres restarting):
+                    # readings stay buffered/queued; back off and retry
+                    logger.error(f"❌ DB worker error (will retry): {e}")
+                    time.sleep(1.0)
+        finally:
+            logger.critical("❌ DB worker thread exited — readings are no "
+                            "longer being written to the database")
+
     def start(self):
         """Start the subscriber (blocking)"""
         logger.info("🚀 MQTT Subscriber service started")
         logger.info("📊 Waiting for sensor data...")
         logger.info("Press Ctrl+C to stop\n")
 
+        if self.db_manager:
+            self._worker = threading.Thread(
+                target=self._db_worker, name="db-worker", daemon=True
+            )
+            self._worker.start()
+
+        # loop_start() runs the network loop on its own thread; the main
+        # thread only waits for shutdown. Periodic flushing lives in the
+        # DB worker (queue get timeout), not here, so all cursor access
+        # stays on one thread.
+        self.client.loop_start()
         try:
-            self.client.loop_forever()
+            while True:
+                time.sleep(0.25)
         except KeyboardInterrupt:
             logger.info("\n⏹️  Service stopped by user")
         except Exception as e:
             logger.error(f"❌ Error in subscriber loop: {e}")
         finally:
+            self.client.loop_stop()
             self.cleanup()
 
     def cleanup(self):
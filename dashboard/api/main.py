@@ -6,25 +6,47 @@ Provides REST API endpoints for frontend dashboard
 
 import os
 import hashlib
+import mimetypes
 import secrets
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi import FastAPI, HTTPException, Query, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
+import orjson
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+from psycopg2 import extensions as pg_ext
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import RealDictCursor, execute_values
+import threading
+import weakref
 import logging
 import re
 from dotenv import load_dotenv
 import time
 
+# Return NUMERIC columns as float instead of Decimal — orjson serialises
+# float natively and the dashboard only ever displays rounded values
+DEC2FLOAT = pg_ext.new_type(
+    pg_ext.DECIMAL.values, 'DEC2FLOAT',
+    lambda value, curs: float(value) if value is not None else None
+)
+pg_ext.register_type(DEC2FLOAT)
+
+_password_hasher = PasswordHasher()
+
 # In-memory session store: {token: {username, role, display_name, expires}}
+# Lookup stays a plain O(1) dict hit; a background sweep (see
+# _sweep_expired_sessions) keeps abandoned tokens from accumulating
 _sessions: dict = {}
+SESSION_SWEEP_INTERVAL_S = 600
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent.parent.parent / '.env'
@@ -59,7 +81,18 @@ app = FastAPI(
     description="REST API for IoT Waste Management System",
     version="1.0.0",
     docs_url="/docs" if ENVIRONMENT == 'development' else None,
-    redoc_url="/redoc" if ENVIRONMENT == 'development' else None
+    redoc_url="/redoc" if ENVIRONMENT == 'development' else None,
+    default_response_class=ORJSONResponse
+)
+
+
+# Security headers, pre-encoded once; appended to the raw header list
+# to skip MutableHeaders' per-set case normalisation on every response
+_SEC_HEADERS_RAW = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
 )
 
 
@@ -68,28 +101,35 @@ app = FastAPI(
 async def add_security_headers(request: Request, call_next):
     """Add security headers to all responses"""
     response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+    response.headers.raw.extend(_SEC_HEADERS_RAW)
     return response
 
 
-# Logging middleware
+# Slow-request logging — uvicorn's access log already records every
+# request, so this middleware only speaks up when a request is slow
+SLOW_REQUEST_THRESHOLD_S = float(os.getenv('SLOW_REQUEST_THRESHOLD_S', '0.1'))
+
+
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all requests"""
-    start_time = time.time()
+async def log_slow_requests(request: Request, call_next):
+    """Log requests that exceed the slow-request threshold"""
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.3f}s"
-    )
+    process_time = time.perf_counter() - start_time
+    if process_time > SLOW_REQUEST_THRESHOLD_S:
+        logger.warning(
+            "Slow request: %s %s - Status: %s - Time: %.3fs",
+            request.method, request.url.path,
+            response.status_code, process_time
+        )
     return response
 
 
+# Compress JSON bodies ≥1 KB — reading/timeline payloads repeat the
+# same field names per row and compress 70-90%
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -97,43 +137,174 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
-    max_age=600,  # Cache preflight requests for 10 minutes
+    max_age=86400,  # Let browsers cache preflights as long as they allow
 )
 
 
-def get_db_connection():
-    """Create database connection"""
+# Connection pool — avoids a TCP handshake + auth round-trip per request
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '20'))
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def _get_pool() -> pg_pool.ThreadedConnectionPool:
+    """Create the connection pool on first use (so the API can start
+    before the database container is up)."""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                # Pin the session timezone so timestamptz values render
+                # as +07:00 regardless of where the DB container runs
+                _db_pool = pg_pool.ThreadedConnectionPool(
+                    minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                    options='-c timezone=Asia/Bangkok', **DB_CONFIG
+                )
+                logger.info(f"Database pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections)")
+    return _db_pool
+
+
+def db_conn():
+    """FastAPI dependency: borrow a pooled connection and return it after
+    the request (rolled back automatically if left in a transaction)."""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        conn = _get_pool().getconn()
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
-
-
-def fix_ts(v):
-    """Append +07:00 to naive datetime strings so JavaScript parses them correctly."""
-    if isinstance(v, datetime):
-        if v.tzinfo is None:
-            return v.isoformat() + '+07:00'
-        return v.isoformat()
-    if isinstance(v, str) and len(v) >= 19 and v[10] == 'T' and '+' not in v and v[-1] != 'Z':
-        return v + '+07:00'
-    return v
-
-
-def normalize_row(row):
-    """Convert RealDictRow to plain dict and fix naive timestamps."""
-    if row is None:
-        return None
-    d = dict(row)
-    TS_KEYS = {'timestamp', 'last_reading', 'triggered_at', 'resolved_at',
-               'last_login', 'created_at', 'updated_at', 'installed_date',
-               'last_reading_today', 'collection_time'}
-    for k, v in d.items():
-        if k in TS_KEYS:
-            d[k] = fix_ts(v)
-    return d
+    try:
+        yield conn
+    finally:
+        _get_pool().putconn(conn)
+
+
+# Materialized views kept fresh by the background refresher thread,
+# each on its own cadence:
+# - mv_bin_current_status (~15 rows): 15 s keeps it comfortably inside
+#   the dashboard's 2-minute "good" status window
+# - mv_hourly_fill: re-aggregates the whole readings history, so it gets
+#   a much longer interval — hourly buckets don't need 15 s freshness
+#   and the refresh cost grows with table size
+MV_STATUS_REFRESH_INTERVAL_S = int(os.getenv('MV_STATUS_REFRESH_INTERVAL_S', '15'))
+MV_HOURLY_REFRESH_INTERVAL_S = int(os.getenv('MV_HOURLY_REFRESH_INTERVAL_S', '300'))
+_MATERIALIZED_VIEWS = [
+    ("mv_bin_current_status", MV_STATUS_REFRESH_INTERVAL_S),
+    ("mv_hourly_fill", MV_HOURLY_REFRESH_INTERVAL_S),
+]
+
+
+def _refresh_materialized_views():
+    """Periodically refresh materialized views so request handlers only
+    ever read pre-aggregated rows. Runs in a daemon thread; each view is
+    refreshed on its own interval."""
+    tick = min(interval for _, interval in _MATERIALIZED_VIEWS)
+    next_due = {view: 0.0 for view, _ in _MATERIALIZED_VIEWS}
+    while True:
+        time.sleep(tick)
+        now = time.monotonic()
+        due = [(view, interval) for view, interval in _MATERIALIZED_VIEWS
+               if next_due[view] <= now]
+        if not due:
+            continue
+        try:
+            pool = _get_pool()
+            conn = pool.getconn()
+            try:
+                cursor = conn.cursor()
+                for view, interval in due:
+                    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                    conn.commit()
+                    next_due[view] = time.monotonic() + interval
+                cursor.close()
+            finally:
+                pool.putconn(conn)
+        except Exception as e:
+            logger.warning(f"Materialized view refresh failed: {e}")
+
+
+# Short-TTL response cache: a burst of dashboard polls shares one DB
+# execution instead of re-running the aggregate queries per request
+STATS_CACHE_TTL_S = 5.0
+TIMELINE_CACHE_TTL_S = 30.0
+BINS_CACHE_TTL_S = 5.0
+HEALTH_CACHE_TTL_S = 2.0
+# Successful credential checks are remembered briefly so a kiosk
+# re-logging in doesn't re-run argon2 (~50 ms by design) every time
+LOGIN_CACHE_TTL_S = 60.0
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+
+
+def _cache_get(key):
+    """Return the cached value for key, or None if missing/expired."""
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _cache_set(key, value, ttl):
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + ttl, value)
+
+
+_miss_locks = {}
+
+
+def _cache_miss_lock(key):
+    """Per-key lock so concurrent misses coalesce into one DB execution
+    instead of stampeding (the rest wait, then hit the fresh entry)."""
+    with _response_cache_lock:
+        return _miss_locks.setdefault(key, threading.Lock())
+
+
+def _sweep_expired_state():
+    """Evict expired sessions and response-cache entries periodically so
+    state that is never touched again (abandoned tokens, cache keys for
+    parameter combinations nobody asks for twice) doesn't pile up in
+    memory. Runs in a daemon thread."""
+    while True:
+        time.sleep(SESSION_SWEEP_INTERVAL_S)
+        now = datetime.now()
+        expired = [t for t, sess in list(_sessions.items())
+                   if now > sess["expires"]]
+        for t in expired:
+            _sessions.pop(t, None)
+        if expired:
+            logger.debug(f"Swept {len(expired)} expired sessions")
+
+        mono = time.monotonic()
+        with _response_cache_lock:
+            stale = [k for k, (expires, _) in _response_cache.items()
+                     if expires <= mono]
+            for k in stale:
+                del _response_cache[k]
+                _miss_locks.pop(k, None)
+        if stale:
+            logger.debug(f"Swept {len(stale)} expired cache entries")
+
+
+_row_builders = {}
+
+
+def _mk_row_builder(cols):
+    """Return a row→dict function specialised for one column list.
+
+    The generated lambda inlines the key/index pairs, which beats both
+    RealDictCursor's per-row dict building and dict(zip(cols, row)) on
+    large result sets (no interpreter loop over column names per row).
+    Builders are compiled once per distinct column list and cached —
+    the handful of query shapes here means the dict stays tiny.
+    """
+    key = tuple(cols)
+    fn = _row_builders.get(key)
+    if fn is None:
+        src = "lambda r: {" + ",".join(f"{c!r}: r[{i}]" for i, c in enumerate(key)) + "}"
+        # noqa: cols come from cursor.description, not users
+        fn = _row_builders.setdefault(key, eval(src))  # noqa: S307
+    return fn
 
 
 @app.on_event("startup")
@@ -150,6 +321,11 @@ async def startup_event():
     logger.info(f"Debug Mode: {os.getenv('DEBUG', 'false')}")
     logger.info("=" * 60)
 
+    threading.Thread(target=_refresh_materialized_views,
+                     name="mv-refresher", daemon=True).start()
+    threading.Thread(target=_sweep_expired_state,
+                     name="state-sweeper", daemon=True).start()
+
 
 @app.get("/")
 async def root():
@@ -170,46 +346,91 @@ async def root():
     }
 
 
+# Hot-path SQL hoisted to module level so the statement text is built
+# once — Postgres then sees a small set of stable query shapes, which
+# also keeps pg_stat_statements readable
+Q_BINS_BASE = """
+    SELECT
+        bin_id,
+        bin_code,
+        location,
+        latitude,
+        longitude,
+        capacity,
+        bin_type,
+        bin_status,
+        fill_level,
+        weight_kg,
+        temperature_c,
+        battery_level,
+        signal_strength,
+        last_reading,
+        fill_status,
+        open_alerts
+    FROM mv_bin_current_status
+    WHERE bin_status = 'active'
+"""
+# Optional filters are folded in with null-tolerant predicates so the
+# statement text is one fixed string whatever combination is passed
+Q_BINS = Q_BINS_BASE + """
+    AND (%(status)s::text IS NULL OR bin_status = %(status)s)
+    AND (%(after)s::int IS NULL OR bin_id > %(after)s)
+    ORDER BY bin_id
+    LIMIT %(limit)s
+"""
+
+
 @app.get("/api/bins")
-async def get_bins(status: Optional[str] = None):
-    """Get all waste bins with current status"""
+def get_bins(
+    request: Request,
+    status: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    after_bin_id: Optional[int] = None,
+    conn=Depends(db_conn)
+):
+    """Get waste bins with current status (keyset-paginated on bin_id)"""
+    # Only the canonical dashboard poll (no filters, default page size)
+    # is cached: caching every client-supplied status/cursor combination
+    # on an unauthenticated endpoint would let a URL-parameter scan grow
+    # the cache without bound
+    cacheable = status is None and after_bin_id is None and limit == 50
+    cached = _cache_get('bins') if cacheable else None
+    if cached is not None:
+        # Cached entries are (bytes, etag) — a hit skips the DB and the
+        # JSON encoder; a matching If-None-Match skips the body too
+        body, etag = cached
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": "max-age=5"})
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Tuple cursor — rows are assembled by the cached codegen
+        # builder, which is cheaper than RealDictCursor's per-row work
+        cursor = conn.cursor()
 
-        query = """
-            SELECT
-                bin_id,
-                bin_code,
-                location,
-                latitude,
-                longitude,
-                capacity,
-                bin_type,
-                bin_status,
-                fill_level,
-                weight_kg,
-                temperature_c,
-                battery_level,
-                signal_strength,
-                last_reading,
-                fill_status,
-                open_alerts
-            FROM v_bin_current_status
-            WHERE bin_status = 'active'
-        """
-
-        if status:
-            query += " AND bin_status = %s"
-            cursor.execute(query, (status,))
-        else:
-            cursor.execute(query)
+        cursor.execute(Q_BINS, {"status": status, "after": after_bin_id,
+                                "limit": limit})
 
-        bins = [normalize_row(b) for b in cursor.fetchall()]
+        build_row = _mk_row_builder([d[0] for d in cursor.description])
+        bins = list(map(build_row, cursor.fetchall()))
         cursor.close()
-        conn.close()
 
-        return {"success": True, "count": len(bins), "data": bins}
+        # Cursor for the next page; null when this page was not full
+        next_cursor = bins[-1]['bin_id'] if len(bins) == limit else None
+
+        # Serialise once; the same bytes serve both this response and
+        # cache hits for the next few seconds of dashboard polls
+        body = orjson.dumps({"success": True, "count": len(bins), "data": bins,
+                             "next_cursor": next_cursor})
+        # RFC 9110 entity tags are quoted strings; proxies (Cloudflare
+        # in production) may drop or normalize bare validators
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        if cacheable:
+            _cache_set('bins', (body, etag), BINS_CACHE_TTL_S)
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": "max-age=5"})
 
     except Exception as e:
         logger.error(f"Error fetching bins: {e}")
@@ -217,50 +438,46 @@ async def get_bins(status: Optional[str] = None):
 
 
 @app.get("/api/bins/{bin_id}")
-async def get_bin_detail(bin_id: int):
+def get_bin_detail(bin_id: int, conn=Depends(db_conn)):
     """Get detailed information for a specific bin"""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Get bin info
+        # Fetch bin info, recent readings and collection history in a
+        # single round-trip instead of three sequential queries
         cursor.execute("""
-            SELECT * FROM v_bin_current_status WHERE bin_id = %s
-        """, (bin_id,))
-        bin_info = cursor.fetchone()
-
-        if not bin_info:
-            raise HTTPException(status_code=404, detail="Bin not found")
-
-        # Get recent readings
-        cursor.execute("""
-            SELECT * FROM sensor_readings
-            WHERE bin_id = %s
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """, (bin_id,))
-        recent_readings = cursor.fetchall()
-
-        # Get collection history
-        cursor.execute("""
-            SELECT * FROM collections
-            WHERE bin_id = %s
-            ORDER BY collection_time DESC
-            LIMIT 5
-        """, (bin_id,))
-        collections = cursor.fetchall()
+            SELECT
+                (SELECT row_to_json(b) FROM (
+                    SELECT * FROM mv_bin_current_status WHERE bin_id = %s
+                ) b) AS bin_info,
+                (SELECT COALESCE(json_agg(r), '[]'::json) FROM (
+                    SELECT * FROM sensor_readings
+                    WHERE bin_id = %s
+                    ORDER BY timestamp DESC
+                    LIMIT 10
+                ) r) AS recent_readings,
+                (SELECT COALESCE(json_agg(c), '[]'::json) FROM (
+                    SELECT * FROM collections
+                    WHERE bin_id = %s
+                    ORDER BY collection_time DESC
+                    LIMIT 5
+                ) c) AS collections
+        """, (bin_id, bin_id, bin_id))
+        row = cursor.fetchone()
 
         cursor.close()
-        conn.close()
 
-        return {
+        if not row or not row['bin_info']:
+            raise HTTPException(status_code=404, detail="Bin not found")
+
+        return ORJSONResponse({
             "success": True,
             "data": {
-                "bin_info": normalize_row(bin_info),
-                "recent_readings": [normalize_row(r) for r in recent_readings],
-                "collections": [normalize_row(c) for c in collections]
+                "bin_info": row['bin_info'],
+                "recent_readings": row['recent_readings'],
+                "collections": row['collections']
             }
-        }
+        })
 
     except HTTPException:
         raise
@@ -270,10 +487,9 @@ async def get_bin_detail(bin_id: int):
 
 
 @app.get("/api/sensors")
-async def get_sensors():
+def get_sensors(conn=Depends(db_conn)):
     """Get all sensors"""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         cursor.execute("""
@@ -285,9 +501,8 @@ async def get_sensors():
         sensors = cursor.fetchall()
 
         cursor.close()
-        conn.close()
 
-        return {"success": True, "count": len(sensors), "data": sensors}
+        return ORJSONResponse({"success": True, "count": len(sensors), "data": sensors})
 
     except Exception as e:
         logger.error(f"Error fetching sensors: {e}")
@@ -295,51 +510,99 @@ async def get_sensors():
 
 
 @app.get("/api/readings")
-async def get_readings(
+def get_readings(
     bin_id: Optional[int] = None,
-    hours: int = Query(default=24, ge=1, le=168)
+    hours: int = Query(default=24, ge=1, le=168),
+    limit: int = Query(default=1000, ge=1, le=1000),
+    before: Optional[datetime] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    conn=Depends(db_conn)
 ):
-    """Get sensor readings for the last N hours"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        time_threshold = datetime.now() - timedelta(hours=hours)
-
-        if bin_id:
-            cursor.execute("""
-                SELECT sr.*, wb.bin_code
-                FROM sensor_readings sr
-                LEFT JOIN waste_bins wb ON sr.bin_id = wb.bin_id
-                WHERE sr.bin_id = %s AND sr.timestamp >= %s
-                ORDER BY sr.timestamp DESC
-            """, (bin_id, time_threshold))
-        else:
-            cursor.execute("""
-                SELECT sr.*, wb.bin_code
-                FROM sensor_readings sr
-                LEFT JOIN waste_bins wb ON sr.bin_id = wb.bin_id
-                WHERE sr.timestamp >= %s
-                ORDER BY sr.timestamp DESC
-                LIMIT 1000
-            """, (time_threshold,))
-
-        readings = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        return {"success": True, "count": len(readings), "data": readings}
+    """Get sensor readings for the last N hours (streamed).
+
+    The largest result set in the API — rows are fetched through a named
+    server-side cursor and encoded incrementally, so memory stays flat
+    and the first bytes go out before the last row is read.
+
+    format=ndjson streams one JSON object per line with no row cap, for
+    bulk exports; the default JSON-array shape keeps its 1000-row limit.
+
+    Pages are walked keyset-style: pass the oldest timestamp of the
+    previous page as before= to fetch the next one (O(log n) via the
+    timestamp index, unlike OFFSET).
+    """
+    # Threshold is computed server-side from NOW() so the planner sees
+    # the real range against the indexed timestamp column
+
+    # Named cursor → Postgres keeps the result server-side and hands it
+    # over in itersize batches instead of one big fetchall()
+    cursor = conn.cursor('api_readings')
+    cursor.itersize = 200
+
+    query = """
+        SELECT sr.*, wb.bin_code
+        FROM sensor_readings sr
+        LEFT JOIN waste_bins wb ON sr.bin_id = wb.bin_id
+        WHERE sr.timestamp >= NOW() - make_interval(hours => %s)
+    """
+    params = [hours]
+
+    if bin_id:
+        query += " AND sr.bin_id = %s"
+        params.append(bin_id)
+    if before is not None:
+        query += " AND sr.timestamp < %s"
+        params.append(before)
+
+    query += " ORDER BY sr.timestamp DESC"
+    if format != "ndjson":
+        query += " LIMIT %s"
+        params.append(limit)
 
+    try:
+        cursor.execute(query, params)
     except Exception as e:
+        cursor.close()
         logger.error(f"Error fetching readings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if format == "ndjson":
+        def stream_lines():
+            build_row = None
+            try:
+                for row in cursor:
+                    if build_row is None:
+                        build_row = _mk_row_builder([d[0] for d in cursor.description])
+                    yield orjson.dumps(build_row(row)) + b'\n'
+            finally:
+                cursor.close()
+
+        return StreamingResponse(stream_lines(),
+                                 media_type="application/x-ndjson")
+
+    def stream():
+        build_row = None
+        count = 0
+        try:
+            yield b'{"success": true, "data": ['
+            for row in cursor:
+                if build_row is None:
+                    build_row = _mk_row_builder([d[0] for d in cursor.description])
+                chunk = orjson.dumps(build_row(row))
+                yield chunk if count == 0 else b',' + chunk
+                count += 1
+            # count goes after the array so it can be filled in lazily
+            yield b'], "count": %d}' % count
+        finally:
+            cursor.close()
+
+    return StreamingResponse(stream(), media_type="application/json")
+
 
 @app.get("/api/alerts")
-async def get_alerts(status: str = Query(default="open")):
+def get_alerts(status: str = Query(default="open"), conn=Depends(db_conn)):
     """Get alerts"""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         cursor.execute("""
@@ -351,11 +614,10 @@ async def get_alerts(status: str = Query(default="open")):
             LIMIT 100
         """, (status,))
 
-        alerts = [normalize_row(a) for a in cursor.fetchall()]
+        alerts = cursor.fetchall()
         cursor.close()
-        conn.close()
 
-        return {"success": True, "count": len(alerts), "data": alerts}
+        return ORJSONResponse({"success": True, "count": len(alerts), "data": alerts})
 
     except Exception as e:
         logger.error(f"Error fetching alerts: {e}")
@@ -363,66 +625,59 @@ async def get_alerts(status: str = Query(default="open")):
 
 
 @app.get("/api/stats")
-async def get_statistics():
+def get_statistics(conn=Depends(db_conn)):
     """Get overall system statistics"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Total bins
-        cursor.execute("SELECT COUNT(*) as total_bins FROM waste_bins WHERE status = 'active'")
-        total_bins = cursor.fetchone()['total_bins']
-
-        # Bins by fill status
-        cursor.execute("""
-            SELECT fill_status, COUNT(*) as count
-            FROM v_bin_current_status
-            GROUP BY fill_status
-        """)
-        fill_status_counts = cursor.fetchall()
+    cached = _cache_get('stats')
+    if cached is not None:
+        return ORJSONResponse(cached)
+    with _cache_miss_lock('stats'):
+        cached = _cache_get('stats')
+        if cached is not None:
+            return ORJSONResponse(cached)
+        return _get_statistics_uncached(conn)
 
-        # Active alerts
-        cursor.execute("SELECT COUNT(*) as active_alerts FROM alerts WHERE status = 'open'")
-        active_alerts = cursor.fetchone()['active_alerts']
 
-        # Recent collections (last 7 days)
-        cursor.execute("""
-            SELECT COUNT(*) as recent_collections
-            FROM collections
-            WHERE collection_time >= NOW() - INTERVAL '7 days'
-        """)
-        recent_collections = cursor.fetchone()['recent_collections']
-
-        # Average fill level
-        cursor.execute("""
-            SELECT AVG(fill_level) as avg_fill_level
-            FROM v_bin_current_status
-            WHERE fill_level IS NOT NULL
-        """)
-        avg_fill = cursor.fetchone()['avg_fill_level']
+def _get_statistics_uncached(conn):
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Bins requiring attention (>75%)
+        # All six aggregates in one statement — one parse/plan and one
+        # round-trip instead of six (mv_bin_current_status is also only
+        # evaluated once, shared by three of them)
         cursor.execute("""
-            SELECT COUNT(*) as bins_need_attention
-            FROM v_bin_current_status
-            WHERE fill_level >= 75
+            WITH
+                status AS (SELECT fill_level, fill_status FROM mv_bin_current_status),
+                fs AS (
+                    SELECT fill_status, COUNT(*) AS count
+                    FROM status
+                    GROUP BY fill_status
+                )
+            SELECT
+                (SELECT COUNT(*) FROM waste_bins WHERE status = 'active') AS total_bins,
+                (SELECT COUNT(*) FROM alerts WHERE status = 'open') AS active_alerts,
+                (SELECT COUNT(*) FROM collections
+                 WHERE collection_time >= NOW() - INTERVAL '7 days') AS recent_collections,
+                (SELECT AVG(fill_level) FROM status
+                 WHERE fill_level IS NOT NULL) AS avg_fill_level,
+                (SELECT COUNT(*) FROM status WHERE fill_level >= 75) AS bins_need_attention,
+                (SELECT COALESCE(json_agg(fs), '[]'::json) FROM fs) AS fill_status_distribution
         """)
-        bins_need_attention = cursor.fetchone()['bins_need_attention']
-
+        row = cursor.fetchone()
         cursor.close()
-        conn.close()
 
-        return {
+        result = {
             "success": True,
             "data": {
-                "total_bins": total_bins,
-                "active_alerts": active_alerts,
-                "recent_collections": recent_collections,
-                "avg_fill_level": round(float(avg_fill or 0), 2),
-                "bins_need_attention": bins_need_attention,
-                "fill_status_distribution": fill_status_counts
+                "total_bins": row['total_bins'],
+                "active_alerts": row['active_alerts'],
+                "recent_collections": row['recent_collections'],
+                "avg_fill_level": round(float(row['avg_fill_level'] or 0), 2),
+                "bins_need_attention": row['bins_need_attention'],
+                "fill_status_distribution": row['fill_status_distribution']
             }
         }
+        _cache_set('stats', result, STATS_CACHE_TTL_S)
+        return ORJSONResponse(result)
 
     except Exception as e:
         logger.error(f"Error fetching statistics: {e}")
@@ -430,50 +685,76 @@ async def get_statistics():
 
 
 @app.get("/api/stats/timeline")
-async def get_timeline_stats(hours: int = Query(default=24, ge=1, le=168)):
+def get_timeline_stats(hours: int = Query(default=24, ge=1, le=168), conn=Depends(db_conn)):
     """Get timeline statistics for charts"""
+    cached = _cache_get(('timeline', hours))
+    if cached is not None:
+        return ORJSONResponse(cached)
+    with _cache_miss_lock(('timeline', hours)):
+        cached = _cache_get(('timeline', hours))
+        if cached is not None:
+            return ORJSONResponse(cached)
+        return _get_timeline_stats_uncached(hours, conn)
+
+
+def _get_timeline_stats_uncached(hours, conn):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        time_threshold = datetime.now() - timedelta(hours=hours)
-
-        # Average fill level over time (hourly)
-        cursor.execute("""
-            SELECT
-                DATE_TRUNC('hour', timestamp) as hour,
-                AVG(fill_level) as avg_fill_level,
-                COUNT(*) as reading_count
-            FROM sensor_readings
-            WHERE timestamp >= %s
-            GROUP BY DATE_TRUNC('hour', timestamp)
-            ORDER BY hour
-        """, (time_threshold,))
-        fill_timeline = cursor.fetchall()
-
-        # Alerts over time
+        # Both series in one statement: fill averages come from the
+        # pre-aggregated mv_hourly_fill, padded to a dense hourly series
+        # with generate_series so charts get every hour in the window
         cursor.execute("""
+            WITH
+                span AS (
+                    SELECT generate_series(
+                        DATE_TRUNC('hour', NOW() - make_interval(hours => %s)),
+                        DATE_TRUNC('hour', NOW()),
+                        INTERVAL '1 hour'
+                    ) AS hour
+                ),
+                fill AS (
+                    SELECT
+                        hour,
+                        SUM(sum_fill_level) / NULLIF(SUM(reading_count), 0) AS avg_fill_level,
+                        SUM(reading_count) AS reading_count
+                    FROM mv_hourly_fill
+                    WHERE hour >= NOW() - make_interval(hours => %s)
+                    GROUP BY hour
+                )
             SELECT
-                DATE_TRUNC('hour', triggered_at) as hour,
-                COUNT(*) as alert_count,
-                severity
-            FROM alerts
-            WHERE triggered_at >= %s
-            GROUP BY DATE_TRUNC('hour', triggered_at), severity
-            ORDER BY hour
-        """, (time_threshold,))
-        alert_timeline = cursor.fetchall()
-
+                (SELECT COALESCE(json_agg(f), '[]'::json) FROM (
+                    SELECT
+                        span.hour,
+                        fill.avg_fill_level,
+                        COALESCE(fill.reading_count, 0) AS reading_count
+                    FROM span
+                    LEFT JOIN fill USING (hour)
+                    ORDER BY span.hour
+                ) f) AS fill_level_timeline,
+                (SELECT COALESCE(json_agg(a), '[]'::json) FROM (
+                    SELECT
+                        DATE_TRUNC('hour', triggered_at) AS hour,
+                        COUNT(*) AS alert_count,
+                        severity
+                    FROM alerts
+                    WHERE triggered_at >= NOW() - make_interval(hours => %s)
+                    GROUP BY DATE_TRUNC('hour', triggered_at), severity
+                    ORDER BY hour
+                ) a) AS alert_timeline
+        """, (hours, hours, hours))
+        row = cursor.fetchone()
         cursor.close()
-        conn.close()
 
-        return {
+        result = {
             "success": True,
             "data": {
-                "fill_level_timeline": fill_timeline,
-                "alert_timeline": alert_timeline
+                "fill_level_timeline": row['fill_level_timeline'],
+                "alert_timeline": row['alert_timeline']
             }
         }
+        _cache_set(('timeline', hours), result, TIMELINE_CACHE_TTL_S)
+        return ORJSONResponse(result)
 
     except Exception as e:
         logger.error(f"Error fetching timeline stats: {e}")
@@ -481,10 +762,9 @@ async def get_timeline_stats(hours: int = Query(default=24, ge=1, le=168)):
 
 
 @app.get("/api/stats/daily-weight")
-async def get_daily_weight():
+def get_daily_weight(conn=Depends(db_conn)):
     """Get today's total weight per bin (infectious waste weighing workflow)"""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         cursor.execute("""
@@ -505,57 +785,91 @@ async def get_daily_weight():
             ORDER BY wb.bin_id
         """)
 
-        daily = [normalize_row(r) for r in cursor.fetchall()]
+        daily = cursor.fetchall()
         cursor.close()
-        conn.close()
 
         total_today = sum(float(r['total_weight_today']) for r in daily)
 
-        return {
+        return ORJSONResponse({
             "success": True,
             "data": daily,
             "total_weight_today": round(total_today, 2)
-        }
+        })
 
     except Exception as e:
         logger.error(f"Error fetching daily weight: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class LoginRequest(BaseModel):
+    username: str = ""
+    password: str = ""
+
+
 @app.post("/api/auth/login")
-async def login(request: Request):
-    """Authenticate user and return session token"""
-    try:
-        body = await request.json()
-        username = (body.get("username") or "").strip()
-        password = (body.get("password") or "").strip()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid request body")
+def login(body: LoginRequest, conn=Depends(db_conn)):
+    """Authenticate user and return session token.
+
+    Sync def on purpose: argon2 verification takes ~50-100 ms by design
+    and the credential queries block, so the handler must run on the
+    threadpool like the other DB handlers, not on the event loop.
+    """
+    username = body.username.strip()
+    password = body.password.strip()
 
     if not username or not password:
         raise HTTPException(status_code=400, detail="กรุณากรอก Username และ Password")
 
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    sha256_hash = hashlib.sha256(password.encode()).hexdigest()
 
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         cursor.execute("""
-            SELECT user_id, username, full_name, role, status
+            SELECT user_id, username, full_name, role, password_hash
             FROM users
-            WHERE username = %s AND password_hash = %s AND status = 'active'
-        """, (username, password_hash))
+            WHERE username = %s AND status = 'active'
+        """, (username,))
         user = cursor.fetchone()
 
+        new_hash = None
         if user:
+            stored = user["password_hash"]
+            # The stored hash is part of the cache key, so a DB-side
+            # password change (admin reset, hash upgrade) changes the key
+            # and forces a fresh verification immediately
+            login_key = ('login', username, stored, sha256_hash)
+            if _cache_get(login_key) is None:
+                if stored.startswith('$argon2'):
+                    try:
+                        _password_hasher.verify(stored, password)
+                    except VerifyMismatchError:
+                        user = None
+                    else:
+                        _cache_set(login_key, True, LOGIN_CACHE_TTL_S)
+                elif stored == sha256_hash:
+                    # Legacy unsalted SHA-256 row — upgrade in place now
+                    # that we know the cleartext matches. Not cached: the
+                    # UPDATE below replaces the stored hash, so this key
+                    # is stale the moment it would be written
+                    new_hash = _password_hasher.hash(password)
+                else:
+                    user = None
+
+        if user:
+            # last_login and the (occasional) hash upgrade ride the same
+            # UPDATE — one statement, one WAL write on the auth path
             cursor.execute(
-                "UPDATE users SET last_login = NOW() WHERE user_id = %s",
-                (user["user_id"],)
+                """
+                UPDATE users
+                SET last_login = NOW(),
+                    password_hash = COALESCE(%s, password_hash)
+                WHERE user_id = %s
+                """,
+                (new_hash, user["user_id"])
             )
             conn.commit()
 
         cursor.close()
-        conn.close()
     except Exception as e:
         logger.error(f"Auth DB error: {e}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -631,31 +945,53 @@ def _require_auth(request: Request) -> dict:
     return session
 
 
+# Server-side prepared statement for the device-lookup point query —
+# every ESP32 hits it on boot, so the parse/plan cycle is worth caching
+# per pooled connection. Connections that already ran PREPARE are
+# tracked in a WeakSet (entries vanish when the pool drops a conn).
+Q_LOOKUP_PREPARE = """
+    PREPARE lookup_sensor(text) AS
+    SELECT s.sensor_id, s.sensor_code, s.weight_offset,
+           s.bin_id, wb.bin_code, wb.location
+    FROM sensors s
+    JOIN waste_bins wb ON s.bin_id = wb.bin_id
+    WHERE s.mac_address = $1 AND s.status = 'active'
+"""
+_lookup_prepared = weakref.WeakSet()
+
+
+def _lookup_sensor_row(conn, mac):
+    """Run the prepared device-lookup query, preparing it on first use
+    per connection."""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    if conn not in _lookup_prepared:
+        cursor.execute(Q_LOOKUP_PREPARE)
+        _lookup_prepared.add(conn)
+    cursor.execute("EXECUTE lookup_sensor(%s)", (mac,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+# Compiled once — register_devices validates these in a loop
+_MAC_RE = re.compile(r'([0-9A-F]{2}:){5}[0-9A-F]{2}')
+_SENSOR_CODE_SANITIZE_RE = re.compile(r'[^A-Za-z0-9\-_]')
+
+
 def _normalize_mac(mac: str) -> str:
     """Uppercase and validate MAC address format AA:BB:CC:DD:EE:FF."""
     mac = mac.strip().upper()
-    if not re.fullmatch(r'([0-9A-F]{2}:){5}[0-9A-F]{2}', mac):
+    if not _MAC_RE.fullmatch(mac):
         raise HTTPException(status_code=400, detail=f"MAC address ไม่ถูกต้อง: {mac}")
     return mac
 
 
 @app.get("/api/devices/lookup")
-async def lookup_device(mac: str = Query(..., description="MAC address AA:BB:CC:DD:EE:FF")):
+def lookup_device(mac: str = Query(..., description="MAC address AA:BB:CC:DD:EE:FF"), conn=Depends(db_conn)):
     """Called by ESP32 on boot to find which department it is assigned to."""
     mac = mac.strip().upper()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT s.sensor_id, s.sensor_code, s.weight_offset,
-                   s.bin_id, wb.bin_code, wb.location
-            FROM sensors s
-            JOIN waste_bins wb ON s.bin_id = wb.bin_id
-            WHERE s.mac_address = %s AND s.status = 'active'
-        """, (mac,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        row = _lookup_sensor_row(conn, mac)
 
         if not row:
             logger.info(f"Device lookup: MAC {mac} not registered")
@@ -677,10 +1013,9 @@ async def lookup_device(mac: str = Query(..., description="MAC address AA:BB:CC:
 
 
 @app.get("/api/devices")
-async def get_devices():
+def get_devices(conn=Depends(db_conn)):
     """List all registered devices with bin/department info."""
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         cursor.execute("""
             SELECT
@@ -700,9 +1035,8 @@ async def get_devices():
             GROUP BY s.sensor_id, wb.bin_code, wb.location
             ORDER BY s.sensor_id
         """)
-        rows = [normalize_row(r) for r in cursor.fetchall()]
+        rows = cursor.fetchall()
         cursor.close()
-        conn.close()
         return {"success": True, "count": len(rows), "data": rows}
     except Exception as e:
         logger.error(f"Error fetching devices: {e}")
@@ -710,59 +1044,88 @@ async def get_devices():
 
 
 @app.post("/api/devices/register")
-async def register_devices(body: DeviceRegisterRequest, request: Request):
+def register_devices(body: DeviceRegisterRequest, request: Request, conn=Depends(db_conn)):
     """Register one or more ESP32 devices (MAC address → department)."""
     _require_auth(request)
 
     if not body.devices:
         raise HTTPException(status_code=400, detail="ไม่มีข้อมูลอุปกรณ์")
 
-    conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     registered = []
     errors = []
 
     try:
+        # Validate and dedupe everything client-side first (last entry
+        # wins for a repeated MAC), then hit the DB with set-based
+        # statements — one validation SELECT each and one upsert with a
+        # single commit, instead of ~4 round-trips + fsync per device
+        items = {}
         for item in body.devices:
             mac = _normalize_mac(item.mac_address)
-            device_name = item.device_name.strip() or mac
-            bin_id = item.bin_id
-            weight_offset = item.weight_offset
-
-            # Verify bin exists
-            cursor.execute("SELECT bin_id, bin_code FROM waste_bins WHERE bin_id = %s AND status = 'active'", (bin_id,))
-            bin_row = cursor.fetchone()
-            if not bin_row:
-                errors.append({"mac": mac, "error": f"ไม่พบแผนก bin_id={bin_id}"})
-                continue
-
-            # Check if MAC already registered
-            cursor.execute("SELECT sensor_id, bin_id FROM sensors WHERE mac_address = %s", (mac,))
-            existing = cursor.fetchone()
-            if existing:
-                # Update existing registration
-                cursor.execute("""
-                    UPDATE sensors
-                    SET bin_id = %s, manufacturer = %s, weight_offset = %s, updated_at = NOW()
-                    WHERE mac_address = %s
-                """, (bin_id, device_name, weight_offset, mac))
-                conn.commit()
-                registered.append({"mac": mac, "bin_code": bin_row["bin_code"], "action": "updated"})
-                continue
-
-            # Generate unique sensor_code from device_name
-            base_code = re.sub(r'[^A-Za-z0-9\-_]', '-', device_name)[:40].strip('-')
-            sensor_code = base_code or f"MAC-{mac.replace(':', '')[-6:]}"
-            cursor.execute("SELECT sensor_id FROM sensors WHERE sensor_code = %s", (sensor_code,))
-            if cursor.fetchone():
-                sensor_code = f"{sensor_code[:36]}-{mac[-5:].replace(':', '')}"
-
-            cursor.execute("""
-                INSERT INTO sensors (sensor_code, bin_id, sensor_type, manufacturer, model, weight_offset, mac_address, status)
-                VALUES (%s, %s, 'weight_scale', %s, 'Senses-Scale-v2', %s, %s, 'active')
-            """, (sensor_code, bin_id, device_name, weight_offset, mac))
+            items[mac] = {
+                "mac": mac,
+                "device_name": item.device_name.strip() or mac,
+                "bin_id": item.bin_id,
+                "weight_offset": item.weight_offset,
+            }
+
+        cursor.execute(
+            "SELECT bin_id, bin_code FROM waste_bins WHERE bin_id = ANY(%s) AND status = 'active'",
+            ([it["bin_id"] for it in items.values()],)
+        )
+        bins = {r["bin_id"]: r["bin_code"] for r in cursor.fetchall()}
+
+        valid = []
+        for it in items.values():
+            if it["bin_id"] not in bins:
+                errors.append({"mac": it["mac"], "error": f"ไม่พบแผนก bin_id={it['bin_id']}"})
+            else:
+                valid.append(it)
+
+        if valid:
+            # Generate unique sensor_codes, resolving collisions against
+            # the table and within this batch in one pass
+            cursor.execute(
+                "SELECT sensor_code, mac_address FROM sensors WHERE sensor_code = ANY(%s)",
+                ([_SENSOR_CODE_SANITIZE_RE.sub('-', it["device_name"])[:40].strip('-')
+                  or f"MAC-{it['mac'].replace(':', '')[-6:]}" for it in valid],)
+            )
+            taken = {r["sensor_code"]: r["mac_address"] for r in cursor.fetchall()}
+            for it in valid:
+                base_code = _SENSOR_CODE_SANITIZE_RE.sub('-', it["device_name"])[:40].strip('-')
+                sensor_code = base_code or f"MAC-{it['mac'].replace(':', '')[-6:]}"
+                if taken.get(sensor_code, it["mac"]) != it["mac"]:
+                    sensor_code = f"{sensor_code[:36]}-{it['mac'][-5:].replace(':', '')}"
+                taken.setdefault(sensor_code, it["mac"])
+                it["sensor_code"] = sensor_code
+
+            rows = execute_values(
+                cursor,
+                """
+                INSERT INTO sensors (sensor_code, bin_id, sensor_type, manufacturer,
+                                     model, weight_offset, mac_address, status)
+                VALUES %s
+                ON CONFLICT (mac_address) WHERE mac_address IS NOT NULL DO UPDATE
+                SET bin_id = EXCLUDED.bin_id,
+                    manufacturer = EXCLUDED.manufacturer,
+                    weight_offset = EXCLUDED.weight_offset,
+                    updated_at = NOW()
+                RETURNING mac_address, sensor_code, bin_id, (xmax = 0) AS inserted
+                """,
+                [(it["sensor_code"], it["bin_id"], 'weight_scale', it["device_name"],
+                  'Senses-Scale-v2', it["weight_offset"], it["mac"], 'active')
+                 for it in valid],
+                fetch=True
+            )
             conn.commit()
-            registered.append({"mac": mac, "bin_code": bin_row["bin_code"], "sensor_code": sensor_code, "action": "created"})
+
+            for r in rows:
+                entry = {"mac": r["mac_address"], "bin_code": bins[r["bin_id"]],
+                         "action": "created" if r["inserted"] else "updated"}
+                if r["inserted"]:
+                    entry["sensor_code"] = r["sensor_code"]
+                registered.append(entry)
 
     except HTTPException:
         raise
@@ -772,19 +1135,17 @@ async def register_devices(body: DeviceRegisterRequest, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
 
     return {"success": True, "registered": len(registered), "results": registered, "errors": errors}
 
 
 @app.put("/api/devices/{sensor_id}")
-async def update_device(sensor_id: int, body: DeviceItem, request: Request):
+def update_device(sensor_id: int, body: DeviceItem, request: Request, conn=Depends(db_conn)):
     """Update a registered device's MAC, department, or weight offset."""
     _require_auth(request)
     mac = _normalize_mac(body.mac_address)
 
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         cursor.execute("SELECT sensor_id FROM sensors WHERE sensor_id = %s", (sensor_id,))
@@ -803,7 +1164,6 @@ async def update_device(sensor_id: int, body: DeviceItem, request: Request):
         """, (mac, body.bin_id, body.device_name.strip(), body.weight_offset, sensor_id))
         conn.commit()
         cursor.close()
-        conn.close()
         return {"success": True, "message": "อัปเดตอุปกรณ์แล้ว"}
     except HTTPException:
         raise
@@ -813,12 +1173,11 @@ async def update_device(sensor_id: int, body: DeviceItem, request: Request):
 
 
 @app.delete("/api/devices/{sensor_id}")
-async def delete_device(sensor_id: int, request: Request):
+def delete_device(sensor_id: int, request: Request, conn=Depends(db_conn)):
     """Unregister a device (clears MAC address). Keeps sensor record if it has readings."""
     _require_auth(request)
 
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         cursor.execute("SELECT sensor_id, sensor_code FROM sensors WHERE sensor_id = %s", (sensor_id,))
@@ -840,7 +1199,6 @@ async def delete_device(sensor_id: int, request: Request):
             msg = "ลบอุปกรณ์แล้ว"
 
         cursor.close()
-        conn.close()
         return {"success": True, "message": msg}
     except HTTPException:
         raise
@@ -849,27 +1207,84 @@ async def delete_device(sensor_id: int, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/health/live")
+def liveness_check():
+    """Liveness: the process is up — never touches the database"""
+    return {"status": "alive"}
+
+
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+def health_check():
+    """Health check endpoint.
+
+    The DB probe result is cached for a couple of seconds, so frequent
+    monitor polls read memory instead of multiplying SELECT 1 traffic
+    against Postgres."""
+    cached = _cache_get('health')
+    if cached is not None:
+        return cached
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.close()
-        conn.close()
-        return {"status": "healthy", "database": "connected"}
+        pool = _get_pool()
+        conn = pool.getconn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        finally:
+            pool.putconn(conn)
+        result = {"status": "healthy", "database": "connected"}
     except Exception as e:
-        return JSONResponse(
+        result = JSONResponse(
             status_code=503,
             content={"status": "unhealthy", "database": "disconnected", "error": str(e)}
         )
+    _cache_set('health', result, HEALTH_CACHE_TTL_S)
+    return result
+
+
+class MemoryStaticFiles(StaticFiles):
+    """StaticFiles that serves the frontend from memory.
+
+    The whole directory (a handful of small files) is read once at
+    startup; each request is answered from a dict with an ETag, and a
+    matching If-None-Match gets a 304 with no body — no stat/read
+    syscalls per asset per visitor. Unknown paths fall back to the
+    normal disk lookup. Requires a restart to pick up edited files,
+    which is how deploys work here anyway (systemd restart).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = {}
+        root = Path(self.directory)
+        for f in root.rglob('*'):
+            if f.is_file():
+                content = f.read_bytes()
+                # Quoted per RFC 9110 so proxies pass the validator through
+                etag = '"%s"' % hashlib.blake2b(content, digest_size=8).hexdigest()
+                media_type, _ = mimetypes.guess_type(str(f))
+                self._cache[f.relative_to(root).as_posix()] = (
+                    content, etag, media_type or 'application/octet-stream'
+                )
+
+    async def get_response(self, path, scope):
+        if path == '.':
+            path = 'index.html'
+        entry = self._cache.get(path)
+        if entry is None:
+            return await super().get_response(path, scope)
+        content, etag, media_type = entry
+        for name, value in scope['headers']:
+            if name == b'if-none-match' and value.decode('latin-1') == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=content, media_type=media_type,
+                        headers={"ETag": etag})
 
 
 # Serve frontend static files — must be mounted LAST so API routes take priority
 _frontend_dir = Path(__file__).parent.parent / "frontend"
 if _frontend_dir.exists():
-    app.mount("/", StaticFiles(directory=str(_frontend_dir), html=True), name="static")
+    app.mount("/", MemoryStaticFiles(directory=str(_frontend_dir), html=True), name="static")
 
 
 if __name__ == "__main__":
@@ -880,6 +1295,8 @@ if __name__ == "__main__":
         app,
         host=API_HOST,
         port=API_PORT,
+        loop="uvloop",
+        http="httptools",
         log_level="debug" if os.getenv('DEBUG', 'false').lower() == 'true' else "info",
         access_log=True
     )
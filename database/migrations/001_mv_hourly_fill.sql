@@ -0,0 +1,23 @@
+-- Pre-aggregated hourly fill levels for /api/stats/timeline
+-- ลดการ scan ตาราง sensor_readings ทั้งตารางทุกครั้งที่เปิด dashboard
+--
+-- Apply to an existing database:
+--   docker exec -i waste_db psql -U admin -d wastedb < 001_mv_hourly_fill.sql
+--
+-- The API refreshes this view in the background (MV_HOURLY_REFRESH_INTERVAL_S,
+-- default 300 s — the refresh re-aggregates the full readings history,
+-- so it runs on a much longer cadence than the small status view), and
+-- timeline queries scan ~hours rows instead of the full readings table.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_hourly_fill AS
+SELECT
+    DATE_TRUNC('hour', timestamp) AS hour,
+    bin_id,
+    SUM(fill_level) AS sum_fill_level,
+    COUNT(*) AS reading_count
+FROM sensor_readings
+GROUP BY 1, 2;
+
+-- Required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_hourly_fill_hour_bin
+    ON mv_hourly_fill (hour, bin_id);
@@ -0,0 +1,64 @@
+-- Move alert-threshold logic into the database
+-- เดิม backend ตรวจ threshold ใน Python และยิง SELECT+INSERT เพิ่มต่อทุก reading;
+-- trigger นี้ประเมินกฎเดิม (fill 90/75, battery < 20, temp > 45) ภายใน
+-- transaction ของ INSERT เอง จึงตัด round-trip ฝั่ง subscriber ออกทั้งหมด
+--
+-- Apply to an existing database:
+--   docker exec -i waste_db psql -U admin -d wastedb < 002_alert_trigger.sql
+
+CREATE OR REPLACE FUNCTION fn_check_alerts()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_bin_code VARCHAR(50);
+BEGIN
+    SELECT bin_code INTO v_bin_code FROM waste_bins WHERE bin_id = NEW.bin_id;
+
+    IF NEW.fill_level >= 90 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'bin_full', 'critical',
+               'Bin ' || v_bin_code || ' is ' || ROUND(NEW.fill_level, 1)
+               || '% full - requires immediate collection', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'bin_full' AND status = 'open'
+        );
+    ELSIF NEW.fill_level >= 75 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'bin_full', 'high',
+               'Bin ' || v_bin_code || ' is ' || ROUND(NEW.fill_level, 1)
+               || '% full - collection needed soon', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'bin_full' AND status = 'open'
+        );
+    END IF;
+
+    IF NEW.battery_level < 20 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'sensor_fault', 'medium',
+               'Low battery warning for ' || v_bin_code || ': '
+               || ROUND(NEW.battery_level, 1) || '%', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'sensor_fault' AND status = 'open'
+        );
+    END IF;
+
+    IF NEW.temperature_c > 45 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'unusual_activity', 'high',
+               'High temperature detected in ' || v_bin_code || ': '
+               || ROUND(NEW.temperature_c, 1) || '°C', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'unusual_activity' AND status = 'open'
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_check_alerts ON sensor_readings;
+CREATE TRIGGER trg_check_alerts AFTER INSERT ON sensor_readings
+    FOR EACH ROW EXECUTE FUNCTION fn_check_alerts();
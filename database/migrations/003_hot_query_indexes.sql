@@ -0,0 +1,23 @@
+-- Indexes สำหรับ query ที่ยิงบ่อยบน ingest path และ dashboard
+-- * sensors(mac_address)                  — lookup ตอน subscriber resolve อุปกรณ์
+-- * alerts(bin_id, alert_type) เฉพาะ open — dedup check ใน fn_check_alerts
+-- * sensor_readings(bin_id, timestamp)    — "readings ล่าสุดของแผนกนี้" ทุกหน้า detail
+-- sensor_code มี UNIQUE constraint (= index) อยู่แล้วตั้งแต่ schema แรก
+--
+-- หมายเหตุ: คอลัมน์ mac_address / weight_offset ถูกเพิ่มบน production ด้วย
+-- ALTER มือมาก่อน — ประกาศไว้ที่นี่ (และใน schema.sql) ให้ fresh install ตรงกัน
+--
+-- Apply to an existing database (CONCURRENTLY ห้ามรันใน transaction):
+--   docker exec -i waste_db psql -U admin -d wastedb < 003_hot_query_indexes.sql
+
+ALTER TABLE sensors ADD COLUMN IF NOT EXISTS mac_address VARCHAR(17);
+ALTER TABLE sensors ADD COLUMN IF NOT EXISTS weight_offset NUMERIC(6, 2) DEFAULT 0;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_sensors_mac_address
+    ON sensors(mac_address) WHERE mac_address IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_open_dedup
+    ON alerts(bin_id, alert_type) WHERE status = 'open';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sensor_readings_bin_time
+    ON sensor_readings(bin_id, timestamp DESC);
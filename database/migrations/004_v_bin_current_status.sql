@@ -0,0 +1,43 @@
+-- ปรับ v_bin_current_status ให้ตรงกับคอลัมน์ที่ API เลือกจริง
+-- (latitude/longitude/weight_kg/signal_strength หายไปจาก schema.sql เดิม —
+-- production แก้ด้วยมือไว้ fresh install จึงพัง) รูปแบบ view ยังเป็น
+-- LATERAL LIMIT 1 แบบเดิม ซึ่ง planner push เงื่อนไข bin_status ลง
+-- waste_bins ได้ — ใช้ idx_waste_bins_status และ idx_sensor_readings_bin_time
+-- (migration 003) ครบทั้งสองฝั่ง
+--
+-- Apply to an existing database:
+--   docker exec -i waste_db psql -U admin -d wastedb < 004_v_bin_current_status.sql
+
+DROP VIEW IF EXISTS v_bin_current_status;
+
+CREATE OR REPLACE VIEW v_bin_current_status AS
+SELECT
+    wb.bin_id,
+    wb.bin_code,
+    wb.location,
+    wb.latitude,
+    wb.longitude,
+    wb.bin_type,
+    wb.capacity,
+    wb.status as bin_status,
+    sr.fill_level,
+    sr.weight_kg,
+    sr.temperature_c,
+    sr.battery_level,
+    sr.signal_strength,
+    sr.timestamp as last_reading,
+    CASE
+        WHEN sr.fill_level >= 90 THEN 'critical'
+        WHEN sr.fill_level >= 75 THEN 'high'
+        WHEN sr.fill_level >= 50 THEN 'medium'
+        ELSE 'low'
+    END as fill_status,
+    (SELECT COUNT(*) FROM alerts a
+     WHERE a.bin_id = wb.bin_id AND a.status = 'open') as open_alerts
+FROM waste_bins wb
+LEFT JOIN LATERAL (
+    SELECT * FROM sensor_readings
+    WHERE bin_id = wb.bin_id
+    ORDER BY timestamp DESC
+    LIMIT 1
+) sr ON true;
@@ -0,0 +1,13 @@
+-- Materialize v_bin_current_status สำหรับ endpoint ที่ยิงถี่
+-- join + LATERAL + subquery ของ view เดิมถูกคำนวณใหม่ทุก request จาก 4 จุด;
+-- MV นี้เปลี่ยนให้เหลือ index scan แล้วให้ API REFRESH CONCURRENTLY เป็นรอบ ๆ
+-- (ค่า default ทุก 15 วินาที — ดู MV_STATUS_REFRESH_INTERVAL_S)
+--
+-- Apply to an existing database:
+--   docker exec -i waste_db psql -U admin -d wastedb < 005_mv_bin_current_status.sql
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_bin_current_status AS
+SELECT * FROM v_bin_current_status;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_bin_current_status_bin
+    ON mv_bin_current_status (bin_id);
@@ -0,0 +1,124 @@
+-- เปลี่ยนคอลัมน์เวลาทั้งหมดเป็น TIMESTAMPTZ
+-- ของเดิมเป็น naive TIMESTAMP แล้วให้ API เดาโซน (+07:00) ใน normalize_row
+-- ทุก row ทุก response; เก็บเป็น timestamptz แล้ว driver/orjson จะ
+-- ใส่ offset ให้เองและข้อมูลเก่า UTC/UTC+7 ปน ๆ กันจะเลิกเป็นปัญหา
+-- ค่าเดิมตีความเป็นเวลาไทย (ตรงกับ container ที่รัน Asia/Bangkok)
+--
+-- view/MV ที่พิงคอลัมน์พวกนี้ต้อง drop ก่อน ALTER แล้วสร้างใหม่ด้านล่าง
+--
+-- Apply to an existing database:
+--   docker exec -i waste_db psql -U admin -d wastedb < 006_timestamptz.sql
+
+DROP MATERIALIZED VIEW IF EXISTS mv_bin_current_status;
+DROP MATERIALIZED VIEW IF EXISTS mv_hourly_fill;
+DROP VIEW IF EXISTS v_bin_current_status;
+DROP VIEW IF EXISTS v_collection_stats;
+
+ALTER TABLE waste_bins
+    ALTER COLUMN installed_date TYPE TIMESTAMPTZ USING installed_date AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN last_maintenance TYPE TIMESTAMPTZ USING last_maintenance AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE sensors
+    ALTER COLUMN installed_date TYPE TIMESTAMPTZ USING installed_date AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN last_calibration TYPE TIMESTAMPTZ USING last_calibration AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE sensor_readings
+    ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING timestamp AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE collections
+    ALTER COLUMN collection_time TYPE TIMESTAMPTZ USING collection_time AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE alerts
+    ALTER COLUMN triggered_at TYPE TIMESTAMPTZ USING triggered_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN resolved_at TYPE TIMESTAMPTZ USING resolved_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE users
+    ALTER COLUMN last_login TYPE TIMESTAMPTZ USING last_login AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE collection_routes
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok',
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ USING updated_at AT TIME ZONE 'Asia/Bangkok';
+
+ALTER TABLE route_bins
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'Asia/Bangkok';
+
+
+CREATE OR REPLACE VIEW v_bin_current_status AS
+SELECT
+    wb.bin_id,
+    wb.bin_code,
+    wb.location,
+    wb.latitude,
+    wb.longitude,
+    wb.bin_type,
+    wb.capacity,
+    wb.status as bin_status,
+    sr.fill_level,
+    sr.weight_kg,
+    sr.temperature_c,
+    sr.battery_level,
+    sr.signal_strength,
+    sr.timestamp as last_reading,
+    CASE
+        WHEN sr.fill_level >= 90 THEN 'critical'
+        WHEN sr.fill_level >= 75 THEN 'high'
+        WHEN sr.fill_level >= 50 THEN 'medium'
+        ELSE 'low'
+    END as fill_status,
+    (SELECT COUNT(*) FROM alerts a
+     WHERE a.bin_id = wb.bin_id AND a.status = 'open') as open_alerts
+FROM waste_bins wb
+LEFT JOIN LATERAL (
+    SELECT * FROM sensor_readings
+    WHERE bin_id = wb.bin_id
+    ORDER BY timestamp DESC
+    LIMIT 1
+) sr ON true;
+
+
+CREATE OR REPLACE VIEW v_collection_stats AS
+SELECT
+    wb.bin_id,
+    wb.bin_code,
+    wb.location,
+    COUNT(c.collection_id) as total_collections,
+    AVG(c.fill_level_before) as avg_fill_before_collection,
+    SUM(c.weight_collected) as total_weight_collected,
+    MAX(c.collection_time) as last_collection_time,
+    AVG(c.duration_minutes) as avg_collection_duration
+FROM waste_bins wb
+LEFT JOIN collections c ON wb.bin_id = c.bin_id
+GROUP BY wb.bin_id, wb.bin_code, wb.location;
+
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_hourly_fill AS
+SELECT
+    DATE_TRUNC('hour', timestamp) AS hour,
+    bin_id,
+    SUM(fill_level) AS sum_fill_level,
+    COUNT(*) AS reading_count
+FROM sensor_readings
+GROUP BY 1, 2;
+
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_hourly_fill_hour_bin
+    ON mv_hourly_fill (hour, bin_id);
+
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_bin_current_status AS
+SELECT * FROM v_bin_current_status;
+
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_bin_current_status_bin
+    ON mv_bin_current_status (bin_id);
+
@@ -11,10 +11,10 @@ CREATE TABLE IF NOT EXISTS waste_bins (
     capacity INTEGER NOT NULL,  -- ความจุในหน่วยลิตร
     bin_type VARCHAR(50) NOT NULL,  -- general, recycle, organic, hazardous
     status VARCHAR(20) DEFAULT 'active',  -- active, inactive, maintenance
-    installed_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    last_maintenance TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    installed_date TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    last_maintenance TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง sensors: ข้อมูล sensor ที่ติดตั้งในถังขยะ
@@ -27,10 +27,12 @@ CREATE TABLE IF NOT EXISTS sensors (
     model VARCHAR(100),
     firmware_version VARCHAR(50),
     status VARCHAR(20) DEFAULT 'active',  -- active, inactive, faulty
-    installed_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    last_calibration TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    installed_date TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    last_calibration TIMESTAMPTZ,
+    mac_address VARCHAR(17),             -- ผูกอุปกรณ์จริงกับ sensor (ESP32)
+    weight_offset NUMERIC(6, 2) DEFAULT 0,  -- ค่า calibrate น้ำหนักต่ออุปกรณ์
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง sensor_readings: บันทึกข้อมูลจาก sensors
@@ -46,8 +48,8 @@ CREATE TABLE IF NOT EXISTS sensor_readings (
     gas_level DECIMAL(5, 2),  -- ระดับก๊าซ
     battery_level DECIMAL(5, 2),  -- แบตเตอรี่เครื่องส่ง (0-100)
     signal_strength INTEGER,  -- ความแรงของสัญญาณ (RSSI)
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง collections: บันทึกการเก็บขยะ
@@ -56,12 +58,12 @@ CREATE TABLE IF NOT EXISTS collections (
     bin_id INTEGER REFERENCES waste_bins(bin_id) ON DELETE CASCADE,
     collected_by VARCHAR(100),  -- ชื่อผู้เก็บขยะ/รหัสพนักงาน
     vehicle_id VARCHAR(50),
-    collection_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    collection_time TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
     fill_level_before DECIMAL(5, 2),  -- ระดับความเต็มก่อนเก็บ
     weight_collected DECIMAL(8, 2),  -- น้ำหนักที่เก็บได้
     duration_minutes INTEGER,  -- เวลาที่ใช้ในการเก็บ
     notes TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง alerts: การแจ้งเตือน
@@ -71,12 +73,12 @@ CREATE TABLE IF NOT EXISTS alerts (
     alert_type VARCHAR(50) NOT NULL,  -- bin_full, sensor_fault, maintenance_required, unusual_activity
     severity VARCHAR(20) NOT NULL,  -- low, medium, high, critical
     message TEXT NOT NULL,
-    triggered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    resolved_at TIMESTAMP,
+    triggered_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    resolved_at TIMESTAMPTZ,
     resolved_by VARCHAR(100),
     status VARCHAR(20) DEFAULT 'open',  -- open, acknowledged, resolved, false_alarm
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง users: ผู้ใช้งานระบบ (สำหรับ authentication ในอนาคต)
@@ -89,9 +91,9 @@ CREATE TABLE IF NOT EXISTS users (
     role VARCHAR(20) NOT NULL,  -- admin, operator, viewer
     phone VARCHAR(20),
     status VARCHAR(20) DEFAULT 'active',  -- active, inactive, suspended
-    last_login TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    last_login TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง collection_routes: เส้นทางการเก็บขยะ
@@ -101,8 +103,8 @@ CREATE TABLE IF NOT EXISTS collection_routes (
     description TEXT,
     estimated_duration_minutes INTEGER,
     status VARCHAR(20) DEFAULT 'active',  -- active, inactive
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- ตาราง route_bins: ความสัมพันธ์ระหว่างเส้นทางและถังขยะ
@@ -112,21 +114,24 @@ CREATE TABLE IF NOT EXISTS route_bins (
     bin_id INTEGER REFERENCES waste_bins(bin_id) ON DELETE CASCADE,
     sequence_order INTEGER NOT NULL,  -- ลำดับการเก็บในเส้นทาง
     estimated_time_minutes INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(route_id, bin_id)
 );
 
 -- Indexes สำหรับเพิ่มประสิทธิภาพการค้นหา
 CREATE INDEX idx_sensor_readings_timestamp ON sensor_readings(timestamp DESC);
 CREATE INDEX idx_sensor_readings_bin_id ON sensor_readings(bin_id);
+CREATE INDEX idx_sensor_readings_bin_time ON sensor_readings(bin_id, timestamp DESC);
 CREATE INDEX idx_sensor_readings_sensor_id ON sensor_readings(sensor_id);
 CREATE INDEX idx_collections_bin_id ON collections(bin_id);
 CREATE INDEX idx_collections_time ON collections(collection_time DESC);
 CREATE INDEX idx_alerts_bin_id ON alerts(bin_id);
 CREATE INDEX idx_alerts_status ON alerts(status);
 CREATE INDEX idx_alerts_triggered ON alerts(triggered_at DESC);
+CREATE INDEX idx_alerts_open_dedup ON alerts(bin_id, alert_type) WHERE status = 'open';
 CREATE INDEX idx_waste_bins_status ON waste_bins(status);
 CREATE INDEX idx_waste_bins_type ON waste_bins(bin_type);
+CREATE UNIQUE INDEX idx_sensors_mac_address ON sensors(mac_address) WHERE mac_address IS NOT NULL;
 
 -- Function สำหรับอัพเดท updated_at timestamp อัตโนมัติ
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -159,12 +164,16 @@ SELECT
     wb.bin_id,
     wb.bin_code,
     wb.location,
+    wb.latitude,
+    wb.longitude,
     wb.bin_type,
     wb.capacity,
     wb.status as bin_status,
     sr.fill_level,
+    sr.weight_kg,
     sr.temperature_c,
     sr.battery_level,
+    sr.signal_strength,
     sr.timestamp as last_reading,
     CASE
         WHEN sr.fill_level >= 90 THEN 'critical'
@@ -182,6 +191,89 @@ LEFT JOIN LATERAL (
     LIMIT 1
 ) sr ON true;
 
+
+-- Trigger: สร้าง alert อัตโนมัติเมื่อ reading เกิน threshold
+-- (fill >= 90/75, battery < 20, temp > 45) — ประเมินในฐานข้อมูลแทน backend
+CREATE OR REPLACE FUNCTION fn_check_alerts()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_bin_code VARCHAR(50);
+BEGIN
+    SELECT bin_code INTO v_bin_code FROM waste_bins WHERE bin_id = NEW.bin_id;
+
+    IF NEW.fill_level >= 90 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'bin_full', 'critical',
+               'Bin ' || v_bin_code || ' is ' || ROUND(NEW.fill_level, 1)
+               || '% full - requires immediate collection', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'bin_full' AND status = 'open'
+        );
+    ELSIF NEW.fill_level >= 75 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'bin_full', 'high',
+               'Bin ' || v_bin_code || ' is ' || ROUND(NEW.fill_level, 1)
+               || '% full - collection needed soon', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'bin_full' AND status = 'open'
+        );
+    END IF;
+
+    IF NEW.battery_level < 20 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'sensor_fault', 'medium',
+               'Low battery warning for ' || v_bin_code || ': '
+               || ROUND(NEW.battery_level, 1) || '%', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'sensor_fault' AND status = 'open'
+        );
+    END IF;
+
+    IF NEW.temperature_c > 45 THEN
+        INSERT INTO alerts (bin_id, alert_type, severity, message, status)
+        SELECT NEW.bin_id, 'unusual_activity', 'high',
+               'High temperature detected in ' || v_bin_code || ': '
+               || ROUND(NEW.temperature_c, 1) || '°C', 'open'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM alerts
+            WHERE bin_id = NEW.bin_id AND alert_type = 'unusual_activity' AND status = 'open'
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_check_alerts ON sensor_readings;
+CREATE TRIGGER trg_check_alerts AFTER INSERT ON sensor_readings
+    FOR EACH ROW EXECUTE FUNCTION fn_check_alerts();
+
+-- Materialized View: ค่าเฉลี่ย fill level รายชั่วโมง (สำหรับ /api/stats/timeline)
+-- API จะ REFRESH ให้เองทุก MV_HOURLY_REFRESH_INTERVAL_S วินาที
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_hourly_fill AS
+SELECT
+    DATE_TRUNC('hour', timestamp) AS hour,
+    bin_id,
+    SUM(fill_level) AS sum_fill_level,
+    COUNT(*) AS reading_count
+FROM sensor_readings
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_hourly_fill_hour_bin
+    ON mv_hourly_fill (hour, bin_id);
+
+-- Materialized View: snapshot ของ v_bin_current_status — endpoint หลัก ๆ
+-- (/api/bins, /api/bins/{id}, /api/stats) อ่านจากตัวนี้แทน จึงเหลือแค่
+-- index scan ต่อ request; API จะ REFRESH ให้เองทุก MV_STATUS_REFRESH_INTERVAL_S วินาที
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_bin_current_status AS
+SELECT * FROM v_bin_current_status;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_bin_current_status_bin
+    ON mv_bin_current_status (bin_id);
+
 -- View: สถิติการเก็บขยะ
 CREATE OR REPLACE VIEW v_collection_stats AS
 SELECT
@@ -4,15 +4,17 @@ IoT Waste Bin Device Simulator
 Simulates waste bin sensors sending data to MQTT broker
 """
 
-import json
 import os
 import random
+import socket
+import threading
 import time
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List
 
 TH_TZ = timezone(timedelta(hours=7))   # Asia/Bangkok UTC+7
 from pathlib import Path
+import orjson
 import paho.mqtt.client as mqtt
 import logging
 from dotenv import load_dotenv
@@ -29,10 +31,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# One Random instance with its hot methods bound once — saves the
+# module-attribute lookup on every call in the per-tick loops
+_rand = random.Random()
+_uniform = _rand.uniform
+_random = _rand.random
+_randint = _rand.randint
+
+# Fill-level status icons by 25%-band: <50 green, 50-74 yellow, >=75 red
+_ICONS = ("🟢", "🟢", "🟡", "🔴", "🔴")
+
 
 class WasteBinSensor:
     """Simulates a single waste bin with sensors"""
 
+    __slots__ = (
+        "bin_id", "bin_code", "location", "capacity", "bin_type",
+        "fill_level", "temperature", "battery_level", "distance_cm",
+        "fill_rate", "temp_variance", "battery_drain", "_reading", "topic",
+    )
+
     def __init__(self, bin_id: str, bin_code: str, location: str,
                  capacity: int, bin_type: str):
         self.bin_id = bin_id
@@ -42,16 +60,29 @@ class WasteBinSensor:
         self.bin_type = bin_type
 
         # Sensor states
-        self.fill_level = random.uniform(10, 40)  # Start between 10-40%
-        self.temperature = random.uniform(20, 30)  # Celsius
-        self.battery_level = random.uniform(80, 100)  # Percentage
+        self.fill_level = _uniform(10, 40)  # Start between 10-40%
+        self.temperature = _uniform(20, 30)  # Celsius
+        self.battery_level = _uniform(80, 100)  # Percentage
         self.distance_cm = self._calculate_distance()
 
         # Simulation parameters
-        self.fill_rate = random.uniform(0.5, 2.0)  # % per reading
+        self.fill_rate = _uniform(0.5, 2.0)  # % per reading
         self.temp_variance = 0.5
         self.battery_drain = 0.01  # % per reading
 
+        # Reused for every reading: the static fields are set once here and
+        # the dynamic ones are overwritten in place each tick (safe because
+        # the dict is serialized before the next update touches it)
+        self._reading = {
+            "bin_id": bin_id,
+            "bin_code": bin_code,
+            "sensor_code": f"SENS{bin_id.zfill(3)}",
+            "location": location,
+            "bin_type": bin_type,
+        }
+        # Publish topic is fixed per bin; format it once
+        self.topic = f"waste/bins/{bin_code}/sensors"
+
     def _calculate_distance(self) -> float:
         """Calculate distance based on fill level"""
         # Assume bin height is proportional to capacity
@@ -61,41 +92,37 @@ class WasteBinSensor:
     def update_readings(self):
         """Update sensor readings to simulate real sensor behavior"""
         # Gradually fill up
-        self.fill_level = min(100, self.fill_level + random.uniform(0, self.fill_rate))
+        self.fill_level = min(100, self.fill_level + _uniform(0, self.fill_rate))
 
         # Distance decreases as fill level increases
         self.distance_cm = self._calculate_distance()
 
         # Temperature fluctuates slightly
-        self.temperature += random.uniform(-self.temp_variance, self.temp_variance)
+        self.temperature += _uniform(-self.temp_variance, self.temp_variance)
         self.temperature = max(15, min(40, self.temperature))
 
         # Battery slowly drains
         self.battery_level = max(0, self.battery_level - self.battery_drain)
 
         # Simulate occasional collection (reset fill level)
-        if self.fill_level > 85 and random.random() < 0.1:
+        if self.fill_level > 85 and _random() < 0.1:
             logger.info(f"🚛 Bin {self.bin_code} collected! Resetting...")
-            self.fill_level = random.uniform(0, 10)
+            self.fill_level = _uniform(0, 10)
 
-    def get_reading(self) -> Dict:
+    def get_reading(self, ts: datetime) -> Dict:
         """Get current sensor reading as dictionary"""
-        return {
-            "bin_id": self.bin_id,
-            "bin_code": self.bin_code,
-            "sensor_code": f"SENS{self.bin_id.zfill(3)}",
-            "location": self.location,
-            "bin_type": self.bin_type,
-            "fill_level": round(self.fill_level, 2),
-            "distance_cm": round(self.distance_cm, 2),
-            "weight_kg": round(random.uniform(0.5, 5.0), 3),  # infectious waste bag weight
-            "temperature_c": round(self.temperature, 2),
-            "humidity": round(random.uniform(40, 70), 2),
-            "gas_level": round(random.uniform(0, 10), 2),
-            "battery_level": round(self.battery_level, 2),
-            "signal_strength": random.randint(-90, -30),  # RSSI
-            "timestamp": datetime.now(TH_TZ).isoformat(),
-        }
+        reading = self._reading
+        reading["fill_level"] = round(self.fill_level, 2)
+        reading["distance_cm"] = round(self.distance_cm, 2)
+        reading["weight_kg"] = round(_uniform(0.5, 5.0), 3)  # infectious waste bag weight
+        reading["temperature_c"] = round(self.temperature, 2)
+        reading["humidity"] = round(_uniform(40, 70), 2)
+        reading["gas_level"] = round(_uniform(0, 10), 2)
+        reading["battery_level"] = round(self.battery_level, 2)
+        reading["signal_strength"] = _randint(-90, -30)  # RSSI
+        # aware datetime: orjson formats it as RFC3339 with the +07:00 offset
+        reading["timestamp"] = ts
+        return reading
 
 
 class IoTSimulator:
@@ -111,30 +138,42 @@ class IoTSimulator:
         self.client = None
         self.bins: List[WasteBinSensor] = []
         self.connected = False
+        self._connected_event = threading.Event()
+        # QoS 0 by default: this is load generation, not compliance data,
+        # and fire-and-forget publishes do not serialize on broker ACKs
+        self.publish_qos = int(os.getenv('SIMULATOR_QOS', '0'))
 
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
         """Callback when connected to MQTT broker"""
-        if rc == 0:
+        if reason_code == 0:
             self.connected = True
+            self._connected_event.set()
+            # Small payloads every few seconds: disable Nagle so publishes
+            # go out immediately instead of waiting to coalesce
+            try:
+                client.socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
             logger.info(f"✅ Connected to MQTT Broker at {self.mqtt_broker}:{self.mqtt_port}")
         else:
-            logger.error(f"❌ Failed to connect, return code {rc}")
+            logger.error(f"❌ Failed to connect, reason code {reason_code}")
 
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
         """Callback when disconnected from MQTT broker"""
         self.connected = False
-        logger.warning(f"⚠️  Disconnected from MQTT Broker, return code {rc}")
-
-    def on_publish(self, client, userdata, mid):
-        """Callback when message is published"""
-        logger.debug(f"Message {mid} published")
+        self._connected_event.clear()
+        logger.warning(f"⚠️  Disconnected from MQTT Broker, reason code {reason_code}")
 
     def setup_mqtt(self):
         """Initialize MQTT client"""
-        self.client = mqtt.Client(client_id="waste_bin_simulator")
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                                  client_id="waste_bin_simulator")
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
-        self.client.on_publish = self.on_publish
+        # No on_publish handler: at the default QoS 0 there is no ACK to
+        # report, and skipping it spares paho a callback dispatch per message
+        # Let QoS>0 publishes pipeline instead of serializing on ACKs
+        self.client.max_inflight_messages_set(100)
 
         # Set username and password if provided
         if self.mqtt_username and self.mqtt_password:
@@ -148,13 +187,8 @@ class IoTSimulator:
             self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
             self.client.loop_start()
 
-            # Wait for connection
-            timeout = 10
-            start_time = time.time()
-            while not self.connected and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
-
-            if not self.connected:
+            # Wait for connection (signaled from on_connect)
+            if not self._connected_event.wait(timeout=10):
                 logger.error("❌ Connection timeout!")
                 return False
 
@@ -170,26 +204,26 @@ class IoTSimulator:
         self.bins.append(bin_sensor)
         logger.info(f"➕ Added bin: {bin_code} at {location}")
 
-    def publish_reading(self, bin_sensor: WasteBinSensor):
+    def publish_reading(self, bin_sensor: WasteBinSensor, ts: datetime):
         """Publish sensor reading to MQTT"""
         if not self.connected:
             logger.warning("⚠️  Not connected to MQTT broker")
             return
 
-        reading = bin_sensor.get_reading()
-        topic = f"waste/bins/{bin_sensor.bin_code}/sensors"
+        reading = bin_sensor.get_reading(ts)
 
         # Publish to MQTT
-        result = self.client.publish(topic, json.dumps(reading), qos=1)
+        result = self.client.publish(bin_sensor.topic, orjson.dumps(reading),
+                                     qos=self.publish_qos)
 
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            fill_icon = "🟢" if reading["fill_level"] < 50 else "🟡" if reading["fill_level"] < 75 else "🔴"
-            logger.info(
-                f"{fill_icon} {bin_sensor.bin_code}: "
-                f"Fill={reading['fill_level']:.1f}% | "
-                f"Temp={reading['temperature_c']:.1f}°C | "
-                f"Battery={reading['battery_level']:.1f}%"
-            )
+            if logger.isEnabledFor(logging.INFO):
+                fill_icon = _ICONS[min(4, int(reading["fill_level"]) // 25)]
+                logger.info(
+                    "%s %s: Fill=%.1f%% | Temp=%.1f°C | Battery=%.1f%%",
+                    fill_icon, bin_sensor.bin_code, reading["fill_level"],
+                    reading["temperature_c"], reading["battery_level"],
+                )
         else:
             logger.error(f"❌ Failed to publish for {bin_sensor.bin_code}")
 
@@ -214,19 +248,28 @@ class IoTSimulator:
 
         start_time = time.time()
         iteration = 0
+        # Monotonic deadline keeps the cadence fixed regardless of how
+        # long publishing an iteration takes
+        next_deadline = time.monotonic() + interval
 
         try:
             while True:
                 iteration += 1
-                logger.info(f"\n{'='*60}")
-                logger.info(f"Iteration {iteration} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                logger.info(f"{'='*60}")
+                if logger.isEnabledFor(logging.INFO):
+                    banner = "=" * 60
+                    logger.info(
+                        "\n%s\nIteration %d - %s\n%s",
+                        banner, iteration,
+                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"), banner,
+                    )
 
                 # Update and publish readings for all bins
+                # (one timestamp per iteration — the bins publish within ms
+                # of each other anyway)
+                ts = datetime.now(TH_TZ)
                 for bin_sensor in self.bins:
                     bin_sensor.update_readings()
-                    self.publish_reading(bin_sensor)
-                    time.sleep(0.1)  # Small delay between bins
+                    self.publish_reading(bin_sensor, ts)
 
                 # Check duration limit
                 if duration and (time.time() - start_time) >= duration:
@@ -234,7 +277,10 @@ class IoTSimulator:
                     break
 
                 # Wait for next iteration
-                time.sleep(interval)
+                sleep_for = next_deadline - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+                next_deadline += interval
 
         except KeyboardInterrupt:
             logger.info("\n\n⏹️  Simulation stopped by user")